@@ -0,0 +1,33 @@
+import utime
+
+#Purpose of this module is to provide manual diagnostics for motors, ultrasonic sensor and buzzer
+#Used from test.py menu and from main.py when host requests a test over protocol
+
+def test_motors(lcd, motor0, motor1):
+    lcd.clear()
+    lcd.move_to(0, 0)
+    lcd.putstr("Testing motors")
+    
+    motor0.drive(1.0)
+    utime.sleep_ms(500)
+    motor0.drive(-1.0)
+    utime.sleep_ms(500)
+    motor0.drive(0.0)
+    motor1.drive(1.0)
+    utime.sleep_ms(500)
+    motor1.drive(-1.0)
+    utime.sleep_ms(500)
+    motor1.drive(0.0)
+
+def test_ultrasonic(lcd, sonic):
+    dist = sonic.get_distance_cm()
+    lcd.clear()
+    lcd.move_to(0, 0)
+    lcd.putstr("Distance:  {}".format(dist))
+    utime.sleep_ms(1000)
+    return dist
+
+def test_buzzer(buzzer):
+    buzzer.on()
+    utime.sleep_ms(500)
+    buzzer.off()
@@ -0,0 +1,89 @@
+import utime
+
+#Purpose of this module is to save power by switching off LCD backlight and display when clock is not used
+#The I2C backpack (PCF8574) can only switch backlight on or off, so "dimming" means switching it off.
+
+#New day is detected when clock goes from last hour of day to first hour of day
+DAY_WRAP_WINDOW_S = 3600
+
+
+#Purpose of this class is to keep track of user activity and turn display off after timeout
+#At night (between night_start and night_end) shorter timeout is used and display can be turned off too
+class DisplayPower:
+    def __init__(self, lcd, timeout_s=60, night_start=(22, 0), night_end=(7, 0), night_timeout_s=10, night_display_off=True):
+        self.lcd = lcd
+        self.timeout_ms = timeout_s * 1000
+        self.night_start = night_start[0]*60 + night_start[1]
+        self.night_end = night_end[0]*60 + night_end[1]
+        self.night_timeout_ms = night_timeout_s * 1000
+        self.night_display_off = night_display_off
+
+        now = utime.ticks_ms()
+        self.last_activity = now
+        self.last_update = now
+        self.last_secs = -1
+
+        #On-times of current and previous day in ms
+        self.backlight_ms = 0
+        self.display_ms = 0
+        self.prev_backlight_ms = 0
+        self.prev_display_ms = 0
+
+    def is_night(self, hours, minutes):
+        t = hours*60 + minutes
+        if (self.night_start <= self.night_end):
+            return self.night_start <= t < self.night_end
+        #Night window goes over midnight
+        return t >= self.night_start or t < self.night_end
+
+    def is_awake(self):
+        return self.lcd.backlight != 0 and self.lcd.display_on
+
+    #Called on button press and alarm, turns display on immediately
+    #Returns True if display was sleeping, so caller can ignore the press which only woke it up
+    def wake(self):
+        self.last_activity = utime.ticks_ms()
+        if (self.is_awake()):
+            return False
+        if (not self.lcd.display_on):
+            self.lcd.set_display(True)
+        if (self.lcd.backlight == 0):
+            self.lcd.set_backlight(True)
+        return True
+
+    #Called from main loop, accumulates on-time and switches display off when timeout is reached
+    def update(self, hours, minutes, seconds):
+        now = utime.ticks_ms()
+        dt = utime.ticks_diff(now, self.last_update)
+        self.last_update = now
+        if (self.lcd.backlight != 0):
+            self.backlight_ms += dt
+        if (self.lcd.display_on):
+            self.display_ms += dt
+
+        #Counters are rotated only when clock wraps over midnight, setting clock back does not start new day
+        secs = hours*3600 + minutes*60 + seconds
+        if (self.last_secs >= 86400 - DAY_WRAP_WINDOW_S and secs < DAY_WRAP_WINDOW_S):
+            self.prev_backlight_ms = self.backlight_ms
+            self.prev_display_ms = self.display_ms
+            self.backlight_ms = 0
+            self.display_ms = 0
+        self.last_secs = secs
+
+        night = self.is_night(hours, minutes)
+        timeout = self.night_timeout_ms if night else self.timeout_ms
+        if (utime.ticks_diff(now, self.last_activity) < timeout):
+            return
+        if (self.lcd.backlight != 0):
+            self.lcd.set_backlight(False)
+        if (night and self.night_display_off and self.lcd.display_on):
+            self.lcd.set_display(False)
+
+    #Returns on-times in seconds for today and previous day, used for sizing batteries
+    def report(self):
+        return {
+            "backlight_s": self.backlight_ms // 1000,
+            "display_s": self.display_ms // 1000,
+            "prev_backlight_s": self.prev_backlight_ms // 1000,
+            "prev_display_s": self.prev_display_ms // 1000,
+        }
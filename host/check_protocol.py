@@ -0,0 +1,74 @@
+#Checks frame parser and Link against broken input on PC, exits with error if something fails
+#  python host/check_protocol.py
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import sim
+import protocol
+from machine import UART
+
+
+#Feeds data to parser and returns found frames, at the end input goes idle like when Link times out
+def frames(data):
+    parser = protocol.FrameParser()
+    found = []
+    def take():
+        found.append((parser.cmd, parser.req_id, bytes(parser.buf[2:parser.length])))
+        while (parser.process()):
+            found.append((parser.cmd, parser.req_id, bytes(parser.buf[2:parser.length])))
+    for b in data:
+        if (parser.push(b)):
+            take()
+    while (parser.in_frame()):
+        if (parser.abort()):
+            take()
+    return found
+
+def check(name, got, expected):
+    if (got != expected):
+        print("FAIL {}: got {}, expected {}".format(name, got, expected))
+        return False
+    print("ok   {}".format(name))
+    return True
+
+
+def main():
+    frame = protocol.encode_frame(protocol.CMD_SET_TIME, 7, protocol.FMT_TIME, 12, 30, 0)
+    other = protocol.encode_frame(protocol.CMD_PING, 8)
+    expected = (protocol.CMD_SET_TIME, 7, bytes([12, 30, 0]))
+    ping = (protocol.CMD_PING, 8, b"")
+
+    corrupted = bytearray(frame)
+    corrupted[-1] ^= 0xFF
+    ok = True
+    ok &= check("single frame", frames(frame), [expected])
+    ok &= check("garbage around frames", frames(b"hello\xa5\x00" + frame + b"\xa5\xa5" + other), [expected, ping])
+    ok &= check("truncated frame followed by frame", frames(frame[:5] + frame), [expected])
+    ok &= check("frame inside body of broken frame", frames(b"\xa5\x5a\x20" + frame + other), [expected, ping])
+    ok &= check("bad CRC followed by frame", frames(bytes(corrupted) + other), [ping])
+    ok &= check("bad length followed by frame", frames(b"\xa5\x5a\xff" + frame), [expected])
+
+    #Link drops frame which was left unfinished, so next request gets through
+    sim.reset()
+    uart = UART(0)
+    link = protocol.Link(uart)
+    uart.rx += frame[:6]
+    got = []
+    for i in range(5):
+        if (link.poll()):
+            got.append(link.cmd)
+    sim.clock.advance((protocol.FRAME_TIMEOUT_MS + 1) * 1000)
+    link.poll()
+    uart.rx += other
+    for i in range(5):
+        if (link.poll()):
+            got.append(link.cmd)
+    ok &= check("link timeout in middle of frame", got, [protocol.CMD_PING])
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
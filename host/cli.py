@@ -0,0 +1,193 @@
+#Host side client for binary command protocol (see protocol.py)
+#Runs on PC with CPython and pyserial, example:
+#  python host/cli.py --port /dev/ttyUSB0 set-time now
+#  python host/cli.py --port /dev/ttyUSB0 set-alarm 07:30:00
+#  python host/cli.py --port /dev/ttyUSB0 stream --rate 10 --count 100
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import protocol
+
+STATUS_NAMES = {
+    protocol.STATUS_OK: "ok",
+    protocol.STATUS_BAD_LENGTH: "bad length",
+    protocol.STATUS_BAD_VALUE: "bad value",
+    protocol.STATUS_UNKNOWN_CMD: "unknown command",
+}
+
+TESTS = {
+    "motors": protocol.TEST_MOTORS,
+    "ultrasonic": protocol.TEST_ULTRASONIC,
+    "buzzer": protocol.TEST_BUZZER,
+    "self": protocol.TEST_SELFTEST,
+}
+
+
+class ProtocolError(Exception):
+    pass
+
+
+#Purpose of this class is to send requests and wait for matching responses
+#Telemetry frames received while waiting are passed to on_telemetry callback
+class Client:
+    def __init__(self, port, baudrate=115200, on_telemetry=None):
+        import serial
+        self.serial = serial.Serial(port, baudrate, timeout=0.05)
+        self.parser = protocol.FrameParser()
+        self.pending = b""
+        self.pos = 0
+        self.req_id = 0
+        self.on_telemetry = on_telemetry
+
+    def close(self):
+        self.serial.close()
+
+    #Returns next received frame or None if deadline passes
+    def next_frame(self, deadline):
+        #Frame may still be waiting in parser after previous one
+        if (self.parser.process()):
+            return self.parser
+        while True:
+            while (self.pos < len(self.pending)):
+                b = self.pending[self.pos]
+                self.pos += 1
+                if (self.parser.push(b)):
+                    return self.parser
+            if (time.monotonic() >= deadline):
+                return None
+            self.pending = self.serial.read(64)
+            self.pos = 0
+
+    def request(self, cmd, fmt="", *values, response_fmt=protocol.FMT_STATUS, timeout=2.0):
+        self.req_id = (self.req_id + 1) & 0xFF
+        self.serial.write(protocol.encode_frame(cmd, self.req_id, fmt, *values))
+        deadline = time.monotonic() + timeout
+        while True:
+            frame = self.next_frame(deadline)
+            if (frame is None):
+                raise ProtocolError("no response")
+            if (frame.cmd == protocol.CMD_TELEMETRY):
+                self._telemetry(frame)
+                continue
+            if (frame.cmd != cmd | protocol.RESPONSE or frame.req_id != self.req_id):
+                continue
+            if (frame.data_len == 1 and response_fmt != protocol.FMT_STATUS):
+                #Device returns only status when request was rejected
+                values = frame.unpack(protocol.FMT_STATUS)
+            else:
+                values = frame.unpack(response_fmt)
+            if (values is None):
+                raise ProtocolError("malformed response")
+            if (values[0] != protocol.STATUS_OK):
+                raise ProtocolError(STATUS_NAMES.get(values[0], "status {}".format(values[0])))
+            return values[1:]
+
+    def _telemetry(self, frame):
+        values = frame.unpack(protocol.FMT_TELEMETRY)
+        if (values is not None and self.on_telemetry is not None):
+            self.on_telemetry(values)
+
+    #Waits telemetry frames for given time
+    def listen(self, duration, count=None):
+        deadline = time.monotonic() + duration
+        received = 0
+        while True:
+            frame = self.next_frame(deadline)
+            if (frame is None):
+                return
+            if (frame.cmd == protocol.CMD_TELEMETRY):
+                self._telemetry(frame)
+                received += 1
+                if (count is not None and received >= count):
+                    return
+
+
+def parse_time(s):
+    if (s == "now"):
+        t = time.localtime()
+        return (t.tm_hour, t.tm_min, t.tm_sec)
+    parts = [int(p) for p in s.split(":")]
+    while len(parts) < 3:
+        parts.append(0)
+    return tuple(parts[:3])
+
+def print_telemetry(values):
+    ticks, dist_mm, m0, m1, flags = values
+    dist = "no echo" if dist_mm < 0 else "{:.1f} cm".format(dist_mm/10)
+    print("{:>10} ms  dist {:>9}  motor0 {:>4}%  motor1 {:>4}%  alarm {}  buzzer {}".format(
+        ticks, dist, m0, m1, int(bool(flags & protocol.FLAG_ALARM)), int(bool(flags & protocol.FLAG_BUZZER))))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Remote control for alarm clock")
+    parser.add_argument("--port", required=True, help="serial port, e.g. /dev/ttyUSB0 or COM3")
+    parser.add_argument("--baudrate", type=int, default=115200)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("ping")
+    sub.add_parser("status")
+    p = sub.add_parser("set-time")
+    p.add_argument("time", help="HH:MM:SS or 'now'")
+    p = sub.add_parser("set-alarm")
+    p.add_argument("time", help="HH:MM:SS")
+    sub.add_parser("disable-alarm")
+    sub.add_parser("power")
+    p = sub.add_parser("test")
+    p.add_argument("name", choices=sorted(TESTS))
+    p = sub.add_parser("stream")
+    p.add_argument("--rate", type=float, default=10.0, help="telemetry frames per second, 0 stops streaming")
+    p.add_argument("--count", type=int, default=None, help="stop after this many frames")
+    p.add_argument("--duration", type=float, default=10.0, help="stop after this many seconds")
+    args = parser.parse_args(argv)
+
+    client = Client(args.port, args.baudrate, on_telemetry=print_telemetry)
+    try:
+        if (args.command == "ping"):
+            start = time.monotonic()
+            client.request(protocol.CMD_PING)
+            print("pong in {:.1f} ms".format((time.monotonic() - start)*1000))
+        elif (args.command == "status"):
+            h, m, s, enabled, ah, am, asec = client.request(protocol.CMD_GET_STATUS, response_fmt=protocol.FMT_STATUS_RESPONSE)
+            print("time  {:02d}:{:02d}:{:02d}".format(h, m, s))
+            if (enabled):
+                print("alarm {:02d}:{:02d}:{:02d}".format(ah, am, asec))
+            else:
+                print("alarm disabled")
+        elif (args.command == "set-time"):
+            client.request(protocol.CMD_SET_TIME, protocol.FMT_TIME, *parse_time(args.time))
+        elif (args.command == "set-alarm"):
+            client.request(protocol.CMD_SET_ALARM, protocol.FMT_TIME, *parse_time(args.time))
+        elif (args.command == "disable-alarm"):
+            client.request(protocol.CMD_DISABLE_ALARM)
+        elif (args.command == "power"):
+            backlight, display, prev_backlight, prev_display = client.request(protocol.CMD_GET_POWER, response_fmt=protocol.FMT_POWER_RESPONSE)
+            print("today:     backlight {:.2f} h, display {:.2f} h".format(backlight/3600, display/3600))
+            print("yesterday: backlight {:.2f} h, display {:.2f} h".format(prev_backlight/3600, prev_display/3600))
+        elif (args.command == "test"):
+            result, = client.request(protocol.CMD_RUN_TEST, protocol.FMT_TEST, TESTS[args.name],
+                                     response_fmt=protocol.FMT_TEST_RESPONSE, timeout=10.0)
+            if (args.name == "ultrasonic"):
+                print("distance: {}".format("no echo" if result < 0 else "{:.1f} cm".format(result/10)))
+            elif (args.name == "self"):
+                print("self-test: {}".format("pass" if result == 0 else "{} failed, see selftest.json on device".format(result)))
+        elif (args.command == "stream"):
+            period = 0 if args.rate <= 0 else max(protocol.MIN_STREAM_PERIOD_MS, int(round(1000/args.rate)))
+            client.request(protocol.CMD_SET_STREAM, protocol.FMT_STREAM, period)
+            if (period):
+                try:
+                    client.listen(args.duration, args.count)
+                finally:
+                    client.request(protocol.CMD_SET_STREAM, protocol.FMT_STREAM, 0)
+    except ProtocolError as e:
+        print("error: {}".format(e), file=sys.stderr)
+        return 1
+    finally:
+        client.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+#Simulates robot escaping from corner and dead end during alarm, with and without obstacle map
+#Robot is moved by simulated motors and ultrasonic distance is ray cast against walls.
+#Alarm is stopped (button pressed) when robot has escaped or when time limit is reached.
+#  python host/escape_sim.py
+#  python host/escape_sim.py --json
+
+import argparse
+import json
+import math
+import random
+import sys
+
+import rig
+import sim
+from rig import firmware
+from replay import run_firmware
+from obstacle_map import ObstacleMap
+
+WHEEL_SPEED_CM_S = 30.0 #robot speed with full forward
+WHEELBASE_CM = 20.0 #gives about 172 deg/s turning, a bit off from ObstacleMap calibration on purpose
+ROBOT_RADIUS_CM = 8.0
+SONAR_HALF_ANGLE = math.radians(7.5)
+STEP_US = 5000 #integration step for robot movement
+TIME_LIMIT_US = 60000000
+PRESS_US = 1000000 #how long button is held after escape
+
+
+#Scenarios: walls as line segments, start position, start heading and escape test
+SCENARIOS = {
+    #Open room corner, robot faces straight into corner
+    "corner": {
+        "walls": [((0, 0), (300, 0)), ((0, 0), (0, 300)), ((300, 0), (300, 300)), ((0, 300), (300, 300))],
+        "start": (25.0, 25.0, math.radians(225)),
+        "escaped": lambda x, y: math.hypot(x, y) >= 100,
+    },
+    #Corridor which is 60 cm wide and closed at one end, robot faces the closed end
+    "dead_end": {
+        "walls": [((0, 0), (300, 0)), ((0, 60), (300, 60)), ((0, 0), (0, 60))],
+        "start": (30.0, 30.0, math.radians(180)),
+        "escaped": lambda x, y: x >= 120,
+    },
+}
+#Same corner with bad sensor connection, part of echoes are missed and firmware gets -1 after timeout
+SCENARIOS["corner_dropouts"] = dict(SCENARIOS["corner"], drop=0.3)
+
+
+def _ray_distance(x, y, angle, walls):
+    dx = math.cos(angle)
+    dy = math.sin(angle)
+    best = None
+    for (x1, y1), (x2, y2) in walls:
+        ex = x2 - x1
+        ey = y2 - y1
+        denom = dx * ey - dy * ex
+        if (abs(denom) < 1e-9):
+            continue
+        t = ((x1 - x) * ey - (y1 - y) * ex) / denom
+        u = ((x1 - x) * dy - (y1 - y) * dx) / denom
+        if (t > 0 and 0 <= u <= 1 and (best is None or t < best)):
+            best = t
+    return best
+
+
+#Purpose of this class is to move robot according to motor outputs and to give distance seen by sonar
+class World:
+    def __init__(self, scenario, seed=1):
+        self.walls = scenario["walls"]
+        self.x, self.y, self.theta = scenario["start"]
+        self.escaped_fn = scenario["escaped"]
+        self.drop = scenario.get("drop", 0.0)
+        self.dropped = 0
+        self.noise = random.Random(seed)
+        self.escaped_us = None
+        self.motor_on_us = None
+        self.collisions = 0
+        self.carry_us = 0
+        self.rig = None
+
+    def attach(self, r):
+        self.rig = r
+        self.start_us = sim.clock.now_us
+        sim.clock.listeners.append(self._advance)
+        press = lambda: 1 if (self.escaped_us is not None and sim.clock.now_us < self.escaped_us + PRESS_US) else 0
+        r.buttons.pins[0].source = press
+
+    def sonar_distance(self, now_us):
+        if (self.noise.random() < self.drop):
+            self.dropped += 1
+            return None
+        dists = [_ray_distance(self.x, self.y, self.theta + a, self.walls) for a in (-SONAR_HALF_ANGLE, 0, SONAR_HALF_ANGLE)]
+        dists = [d for d in dists if d is not None]
+        if (not dists):
+            return float("inf") #nothing in range
+        return min(dists) + self.noise.gauss(0, 0.3)
+
+    def _wheel_speed(self, motor):
+        val = motor.en_pin.duty_u16() / 65536
+        if (motor.pin1.state == 0):
+            val = -val
+        return val * WHEEL_SPEED_CM_S
+
+    def _advance(self, now_us, dt_us):
+        #Long sleeps are integrated in small steps
+        self.carry_us += dt_us
+        while (self.carry_us >= STEP_US):
+            self.carry_us -= STEP_US
+            self._step(STEP_US / 1000000)
+        if (self.escaped_us is None and self.escaped_fn(self.x, self.y)):
+            self.escaped_us = now_us + dt_us
+            self.motor_on_us = self.rig.monitor.any_on_us
+
+    def _step(self, dt):
+        v0 = self._wheel_speed(self.rig.motor0)
+        v1 = self._wheel_speed(self.rig.motor1)
+        #motor0 forward and motor1 backward turns right, that is clockwise
+        self.theta += (v1 - v0) / WHEELBASE_CM * dt
+        v = (v0 + v1) / 2
+        if (v == 0):
+            return
+        nx = self.x + v * math.cos(self.theta) * dt
+        ny = self.y + v * math.sin(self.theta) * dt
+        ahead = _ray_distance(self.x, self.y, self.theta if v > 0 else self.theta + math.pi, self.walls)
+        if (ahead is not None and ahead - abs(v) * dt < ROBOT_RADIUS_CM):
+            #Robot is pushing against wall, wheels spin but it does not move
+            self.collisions += 1
+            return
+        self.x = nx
+        self.y = ny
+
+
+def run_scenario(name, use_map, seed=1):
+    world = World(SCENARIOS[name], seed)
+    r = rig.Rig(world.sonar_distance)
+    world.attach(r)
+    start = sim.clock.now_us
+    sim.clock.limit_us = start + TIME_LIMIT_US + 2 * PRESS_US
+    obstacles = ObstacleMap() if use_map else None
+    finished = run_firmware(firmware.alarm_action, None, r.buttons, r.buzzer, r.motor0, r.motor1, r.sonic, None, obstacles)
+    escaped = world.escaped_us is not None and world.escaped_us - start <= TIME_LIMIT_US
+    return {
+        "scenario": name,
+        "strategy": "obstacle_map" if use_map else "alternate",
+        "escaped": escaped,
+        "finished": finished,
+        "escape_time_ms": (world.escaped_us - start) / 1000 if escaped else None,
+        "motor_on_ms": (world.motor_on_us if escaped else r.monitor.any_on_us) / 1000,
+        "collision_steps": world.collisions,
+        "pings": r.sonar.pings,
+        "dropped_echoes": world.dropped,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare escape strategies in simulated scenarios")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), action="append", help="default: all")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="print machine-readable report")
+    args = parser.parse_args(argv)
+
+    results = []
+    for name in (args.scenario or sorted(SCENARIOS)):
+        for use_map in (False, True):
+            results.append(run_scenario(name, use_map, args.seed))
+
+    if (args.json):
+        json.dump(results, sys.stdout, indent=2)
+        print()
+        return 0
+    for r in results:
+        print("{:<15} {:<13} {:<18} motors on {:>8.1f} ms, {:>4} pings, {:>5} collision steps".format(
+            r["scenario"], r["strategy"],
+            "escaped in {:.1f} s".format(r["escape_time_ms"] / 1000) if r["escaped"] else "NOT ESCAPED",
+            r["motor_on_ms"], r["pings"], r["collision_steps"]))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
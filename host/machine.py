@@ -0,0 +1,137 @@
+#Stand-in for MicroPython machine module, backed by device models in host/sim.py
+#Only the parts used by the firmware are implemented
+
+import sim
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+    PULL_UP = 1
+    PULL_DOWN = 2
+
+    def __init__(self, id, mode=-1, pull=-1, value=None):
+        self.id = id
+        self.mode = mode
+        self.state = 1 if pull == Pin.PULL_UP else 0
+        if (value is not None):
+            self.state = int(bool(value))
+        #source() gives value of input driven by model, watchers are called on every write
+        self.source = None
+        self.watchers = []
+        sim.pins[id] = self
+
+    def value(self, v=None):
+        if (v is None):
+            sim.clock.advance(sim.PIN_READ_COST_US)
+            if (self.source is not None):
+                return self.source()
+            return self.state
+        sim.clock.advance(sim.PIN_WRITE_COST_US)
+        self.state = int(bool(v))
+        for watcher in self.watchers:
+            watcher(self.state)
+
+    def __call__(self, v=None):
+        return self.value(v)
+
+    def high(self):
+        self.value(1)
+
+    def low(self):
+        self.value(0)
+
+    def on(self):
+        self.value(1)
+
+    def off(self):
+        self.value(0)
+
+
+class PWM:
+    def __init__(self, pin):
+        self.pin = pin
+        self._freq = 0
+        self._duty = 0
+        sim.pwms[pin.id] = self
+
+    def freq(self, f=None):
+        if (f is None):
+            return self._freq
+        self._freq = f
+
+    def duty_u16(self, d=None):
+        if (d is None):
+            return self._duty
+        self._duty = max(0, min(65535, int(d)))
+
+    def deinit(self):
+        self._duty = 0
+
+
+class I2C:
+    def __init__(self, id, scl=None, sda=None, freq=400000):
+        self.id = id
+        self.freq = freq
+
+    def _transfer(self, addr, nbytes):
+        #Address byte and data bytes are 9 clocks each, plus start/stop overhead
+        sim.clock.advance(int((nbytes + 1) * 9 * 1000000 / self.freq) + 20)
+        if (addr not in sim.i2c_devices):
+            raise OSError(5) #EIO, same as MicroPython when device does not acknowledge
+        return sim.i2c_devices[addr]
+
+    def scan(self):
+        return sorted(sim.i2c_devices)
+
+    def writeto(self, addr, buf):
+        self._transfer(addr, len(buf)).write(bytes(buf))
+        return len(buf)
+
+    def readfrom(self, addr, nbytes):
+        return self._transfer(addr, nbytes).read(nbytes)
+
+    def writeto_mem(self, addr, memaddr, buf):
+        self._transfer(addr, len(buf) + 1).write_mem(memaddr, bytes(buf))
+
+    def readfrom_mem(self, addr, memaddr, nbytes):
+        self._transfer(addr, 1)
+        return self._transfer(addr, nbytes).read_mem(memaddr, nbytes)
+
+
+class RTC:
+    def datetime(self, t=None):
+        state = sim.rtc_state
+        if (t is not None):
+            state["base"] = tuple(t)
+            state["base_us"] = sim.clock.now_us
+            state["source"] = None
+            return
+        if (state["source"] is not None):
+            return state["source"]()
+        year, month, day, weekday, hours, minutes, seconds, subseconds = state["base"]
+        secs = hours*3600 + minutes*60 + seconds + (sim.clock.now_us - state["base_us"]) // 1000000
+        secs %= 86400
+        return (year, month, day, weekday, secs // 3600, (secs // 60) % 60, secs % 60, 0)
+
+
+#UART keeps received bytes in rx buffer which scenario can fill, transmitted bytes go to tx
+class UART:
+    def __init__(self, id, baudrate=115200, tx=None, rx=None, timeout=0):
+        self.id = id
+        self.baudrate = baudrate
+        self.rx = bytearray()
+        self.tx = bytearray()
+
+    def any(self):
+        return len(self.rx)
+
+    def readinto(self, buf, nbytes=None):
+        n = min(len(self.rx), len(buf) if nbytes is None else nbytes)
+        buf[:n] = self.rx[:n]
+        del self.rx[:n]
+        return n
+
+    def write(self, buf):
+        self.tx += bytes(buf)
+        return len(buf)
@@ -0,0 +1,195 @@
+#Replays trace captured with sensor_trace.py (TRACE_PATH in main.py) through firmware code on PC
+#Every alarm in trace is run through main.alarm_action and every button click through Buttons.wait_for_input
+#with buttons, ultrasonic and clock driven from trace. Virtual time is used, so replay runs at full speed.
+#  python host/replay.py trace.bin
+#  python host/replay.py trace.bin --json
+
+import argparse
+import contextlib
+import io
+import json
+import sys
+
+import rig
+import sim
+import sensor_trace
+from rig import firmware
+from obstacle_map import ObstacleMap
+
+#How long firmware may run after last event in trace before replay gives up
+TAIL_US = 5000000
+
+
+#Purpose of this class is to split trace into per-device signals
+class Trace:
+    def __init__(self, records):
+        self.button_edges = [[] for i in range(len(rig.BUTTON_PINS))]
+        self.sonar = []
+        self.rtc = []
+        self.alarms = []
+        self.stopped = None
+        self.end_us = 0
+        for kind, t_ms, value in records:
+            t = t_ms * 1000
+            self.end_us = max(self.end_us, t)
+            if (kind == sensor_trace.EV_BUTTON):
+                self.button_edges[value >> 1].append((t, value & 1))
+            elif (kind == sensor_trace.EV_SONAR):
+                self.sonar.append((t, value / 10 if value >= 0 else None))
+            elif (kind == sensor_trace.EV_RTC):
+                self.rtc.append((t, (t, value)))
+            elif (kind == sensor_trace.EV_ALARM_START):
+                self.alarms.append([t, None])
+            elif (kind == sensor_trace.EV_ALARM_END):
+                if (self.alarms and self.alarms[-1][1] is None):
+                    self.alarms[-1][1] = t
+            elif (kind == sensor_trace.EV_STOPPED):
+                self.stopped = "size limit" if value == sensor_trace.STOP_SIZE else "time limit"
+
+    #Returns time of first button edge to given state at or after t_us, or None
+    def next_edge(self, t_us, state):
+        times = [t for edges in self.button_edges for (t, v) in edges if t >= t_us and v == state]
+        return min(times) if times else None
+
+    def in_alarm(self, t_us):
+        for start, end in self.alarms:
+            if (start <= t_us and (end is None or t_us <= end)):
+                return True
+        return False
+
+
+#Builds simulated hardware which plays back given trace
+def build_rig(trace):
+    sonar = sim.StepSignal(trace.sonar, initial=trace.sonar[0][1] if trace.sonar else None)
+    r = rig.Rig(lambda now_us: sonar.at(now_us))
+    for i in range(len(trace.button_edges)):
+        r.set_button_signal(i, sim.StepSignal(trace.button_edges[i]))
+    if (trace.rtc):
+        #Clock is recorded only when it is set or jumps, in between it runs with trace time
+        clock_base = sim.StepSignal(trace.rtc, initial=trace.rtc[0][1])
+        def rtc_source():
+            base_us, base_secs = clock_base.at(sim.clock.now_us)
+            secs = (base_secs + (sim.clock.now_us - base_us) // 1000000) % 86400
+            return (2000, 1, 1, 5, secs // 3600, (secs // 60) % 60, secs % 60, 0)
+        sim.rtc_state["source"] = rtc_source
+    sim.clock.limit_us = trace.end_us + TAIL_US
+    return r
+
+#Runs firmware function with simulated time, returns False if it did not return before time limit
+def run_firmware(fn, *args):
+    try:
+        #Motor and buzzer classes print on every call, which is only noise here
+        with contextlib.redirect_stdout(io.StringIO()):
+            fn(*args)
+        return True
+    except sim.SimTimeout:
+        return False
+
+
+def replay_alarm(trace, start_us, end_us):
+    r = build_rig(trace)
+    sim.clock.now_us = start_us
+
+    #First moment when firmware notices button press, that is when alarm loop is left
+    noticed = []
+    any_pressed = r.buttons.any_pressed
+    def watched_any_pressed():
+        pressed = any_pressed()
+        if (pressed and not noticed):
+            noticed.append(sim.clock.now_us)
+        return pressed
+    r.buttons.any_pressed = watched_any_pressed
+
+    #Same escape strategy as main.main() uses
+    finished = run_firmware(firmware.alarm_action, None, r.buttons, r.buzzer, r.motor0, r.motor1, r.sonic, None, ObstacleMap())
+    press = trace.next_edge(start_us, 1)
+    result = {
+        "start_ms": start_us / 1000,
+        "finished": finished,
+        "duration_ms": (sim.clock.now_us - start_us) / 1000,
+        "recorded_duration_ms": None if end_us is None else (end_us - start_us) / 1000,
+        "reaction_latency_ms": None,
+        "motor_on_ms": r.monitor.any_on_us / 1000,
+        "pings": r.sonar.pings,
+    }
+    if (press is not None and noticed):
+        result["reaction_latency_ms"] = (noticed[0] - press) / 1000
+    return result
+
+def replay_click(trace, index, press_us, release_us):
+    r = build_rig(trace)
+    sim.clock.now_us = max(0, press_us - 20000)
+    returned = []
+    finished = run_firmware(lambda: returned.append(r.buttons.wait_for_input()))
+    return {
+        "press_ms": press_us / 1000,
+        "button": index,
+        "finished": finished,
+        "returned": returned[0] if returned else None,
+        "latency_ms": (sim.clock.now_us - release_us) / 1000 if finished else None,
+    }
+
+
+def replay(trace):
+    alarms = [replay_alarm(trace, start, end) for start, end in trace.alarms]
+    clicks = []
+    for index in range(len(trace.button_edges)):
+        press = None
+        for t, v in trace.button_edges[index]:
+            if (v == 1):
+                press = t
+            elif (press is not None):
+                if (not trace.in_alarm(press)):
+                    clicks.append(replay_click(trace, index, press, t))
+                press = None
+    clicks.sort(key=lambda c: c["press_ms"])
+    return {"alarms": alarms, "clicks": clicks, "summary": summarize(trace, alarms, clicks)}
+
+def summarize(trace, alarms, clicks):
+    reactions = [a["reaction_latency_ms"] for a in alarms if a["reaction_latency_ms"] is not None]
+    latencies = [c["latency_ms"] for c in clicks if c["latency_ms"] is not None]
+    return {
+        "alarms": len(alarms),
+        "alarms_not_finished": sum(1 for a in alarms if not a["finished"]),
+        "reaction_latency_mean_ms": sum(reactions) / len(reactions) if reactions else None,
+        "reaction_latency_max_ms": max(reactions) if reactions else None,
+        "motor_on_total_ms": sum(a["motor_on_ms"] for a in alarms),
+        "clicks": len(clicks),
+        "clicks_wrong_button": sum(1 for c in clicks if c["returned"] != c["button"]),
+        "click_latency_max_ms": max(latencies) if latencies else None,
+        "trace_stopped": trace.stopped,
+    }
+
+
+def print_report(report):
+    for a in report["alarms"]:
+        print("alarm at {:>10.1f} ms: {} in {:.1f} ms (recorded {}), reaction {} ms, motors on {:.1f} ms, {} pings".format(
+            a["start_ms"], "stopped" if a["finished"] else "NOT STOPPED", a["duration_ms"],
+            "-" if a["recorded_duration_ms"] is None else "{:.1f} ms".format(a["recorded_duration_ms"]),
+            "-" if a["reaction_latency_ms"] is None else "{:.1f}".format(a["reaction_latency_ms"]),
+            a["motor_on_ms"], a["pings"]))
+    for c in report["clicks"]:
+        print("click at {:>10.1f} ms: button {} -> {}, latency {} ms".format(
+            c["press_ms"], c["button"], c["returned"], "-" if c["latency_ms"] is None else "{:.1f}".format(c["latency_ms"])))
+    print("summary:")
+    for key, value in report["summary"].items():
+        print("  {}: {}".format(key, value))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay captured trace through firmware")
+    parser.add_argument("trace")
+    parser.add_argument("--json", action="store_true", help="print machine-readable report")
+    args = parser.parse_args(argv)
+
+    report = replay(Trace(sensor_trace.read_trace(args.trace)))
+    if (args.json):
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        print_report(report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
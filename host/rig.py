@@ -0,0 +1,41 @@
+#Purpose of this module is to build firmware objects on PC with the same wiring as main.main()
+#Importing this module puts host/ (fake machine and utime) and repository root to sys.path
+
+import os
+import sys
+
+HOST_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HOST_DIR, ".."))
+sys.path.insert(0, HOST_DIR)
+
+import sim
+import machine
+from machine import Pin
+import main as firmware
+
+BUTTON_PINS = (2, 3, 4)
+LCD_ADDR = 0x27
+RTC_ADDR = 0x68
+
+
+#Purpose of this class is to hold simulated alarm clock hardware
+#distance_fn(now_us) gives distance seen by ultrasonic sensor in cm
+class Rig:
+    def __init__(self, distance_fn):
+        sim.reset()
+        #LCD backpack and DS3231 answer on the bus like on the real board
+        sim.i2c_devices[LCD_ADDR] = sim.I2CDevice()
+        sim.i2c_devices[RTC_ADDR] = sim.I2CDevice()
+        self.i2c = machine.I2C(0, scl=Pin(17), sda=Pin(16))
+        self.lcd = firmware.LCD(self.i2c, LCD_ADDR, 4, 20)
+        self.buttons = firmware.Buttons(Pin(BUTTON_PINS[0], Pin.IN), Pin(BUTTON_PINS[1], Pin.IN), Pin(BUTTON_PINS[2], Pin.IN))
+        self.motor0 = firmware.Motor(Pin(13), Pin(12, Pin.OUT), Pin(11, Pin.OUT))
+        self.motor1 = firmware.Motor(Pin(18), Pin(19, Pin.OUT), Pin(20, Pin.OUT))
+        self.buzzer = firmware.Buzzer(Pin(22, Pin.OUT))
+        self.sonic = firmware.Ultrasonic(Pin(15, Pin.OUT), Pin(14, Pin.IN))
+        self.sonar = sim.SonarModel(self.sonic.trig, self.sonic.echo, distance_fn)
+        self.monitor = sim.MotorMonitor([self.motor0, self.motor1])
+
+    #Drives button pin from piecewise constant signal
+    def set_button_signal(self, index, signal):
+        self.buttons.pins[index].source = lambda: signal.at(sim.clock.now_us)
@@ -0,0 +1,40 @@
+#Runs selftest.py against simulated hardware on PC and prints the same JSON report as the device
+#Exit code is 0 when all tests pass, so this can be used in scripts
+#  python host/run_selftest.py
+#  python host/run_selftest.py --distance 80 --noise 2.0 --no-rtc
+
+import argparse
+import contextlib
+import io
+import json
+import random
+import sys
+
+import rig
+import sim
+import selftest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run hardware self-test against host simulator")
+    parser.add_argument("--distance", type=float, default=120.0, help="distance seen by ultrasonic sensor in cm")
+    parser.add_argument("--noise", type=float, default=0.2, help="standard deviation of distance noise in cm")
+    parser.add_argument("--pings", type=int, default=10)
+    parser.add_argument("--no-rtc", action="store_true", help="simulate missing RTC at 0x68")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    noise = random.Random(args.seed)
+    r = rig.Rig(lambda now_us: args.distance + noise.gauss(0, args.noise))
+    if (args.no_rtc):
+        del sim.i2c_devices[rig.RTC_ADDR]
+
+    #Motor and buzzer classes print on every call, keep only the report on stdout
+    with contextlib.redirect_stdout(io.StringIO()):
+        report = selftest.run(r.i2c, r.lcd, r.buttons, r.motor0, r.motor1, r.buzzer, r.sonic, pings=args.pings)
+    print(json.dumps(report, indent=2))
+    return 0 if report["pass"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
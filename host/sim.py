@@ -0,0 +1,152 @@
+#Purpose of this module is to provide virtual time and device models for running firmware on PC
+#host/machine.py and host/utime.py are stand-ins for MicroPython modules and are backed by this module.
+#Time is virtual: sleeps only advance the clock, so scenarios run at full speed.
+
+import bisect
+
+#Rough cost of common MicroPython calls on RP2040, added to virtual clock on every call
+#so busy-wait loops make progress and measured timings look like those on the device
+TICKS_COST_US = 4
+PIN_READ_COST_US = 3
+PIN_WRITE_COST_US = 3
+
+
+class SimTimeout(Exception):
+    pass
+
+
+#Purpose of this class is to keep virtual time
+#Listeners are called before time advances with (now_us, dt_us), they can integrate state over time
+class Clock:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.now_us = 0
+        self.limit_us = None
+        self.listeners = []
+
+    def advance(self, us):
+        if (us <= 0):
+            return
+        for listener in self.listeners:
+            listener(self.now_us, us)
+        self.now_us += us
+        if (self.limit_us is not None and self.now_us > self.limit_us):
+            raise SimTimeout("virtual time limit reached at {} us".format(self.now_us))
+
+
+clock = Clock()
+
+#Objects created through host/machine.py, indexed by pin id, so scenarios can find devices created by firmware
+pins = {}
+pwms = {}
+i2c_devices = {}
+rtc_state = {"base": (2000, 1, 1, 5, 0, 0, 0, 0), "base_us": 0, "source": None}
+
+
+#Resets virtual time and forgets all devices, call before each scenario
+def reset():
+    clock.reset()
+    pins.clear()
+    pwms.clear()
+    i2c_devices.clear()
+    rtc_state["base"] = (2000, 1, 1, 5, 0, 0, 0, 0)
+    rtc_state["base_us"] = 0
+    rtc_state["source"] = None
+
+
+#Purpose of this class is to provide piecewise constant signal from list of (time us, value) changes
+class StepSignal:
+    def __init__(self, changes, initial=0):
+        changes = sorted(changes, key=lambda c: c[0])
+        self.times = [c[0] for c in changes]
+        self.values = [c[1] for c in changes]
+        self.initial = initial
+
+    def at(self, t_us):
+        i = bisect.bisect_right(self.times, t_us)
+        if (i == 0):
+            return self.initial
+        return self.values[i-1]
+
+
+#Purpose of this class is to model I2C device as 256 byte register memory
+#Plain writes (like PCF8574 LCD backpack) are counted and last byte is kept
+class I2CDevice:
+    def __init__(self):
+        self.mem = bytearray(256)
+        self.writes = 0
+        self.last = 0
+
+    def write(self, data):
+        self.writes += 1
+        if (data):
+            self.last = data[-1]
+
+    def read(self, nbytes):
+        return bytes([self.last] * nbytes)
+
+    def write_mem(self, reg, data):
+        for i in range(len(data)):
+            self.mem[(reg + i) & 0xFF] = data[i]
+
+    def read_mem(self, reg, nbytes):
+        return bytes(self.mem[(reg + i) & 0xFF] for i in range(nbytes))
+
+
+#Purpose of this class is to model HC-SR04 ultrasonic sensor
+#Echo pulse starts ECHO_DELAY_US after falling edge of trigger and lasts 58 us per cm
+#distance_fn(now_us) returns distance in cm, or None/negative when echo is lost (bad connection)
+#When nothing is in range, echo is held high for OUT_OF_RANGE_US like HC-SR04 does
+class SonarModel:
+    ECHO_DELAY_US = 450
+    MAX_RANGE_CM = 400
+    OUT_OF_RANGE_US = 38000
+
+    def __init__(self, trig_pin, echo_pin, distance_fn):
+        self.distance_fn = distance_fn
+        self.echo_start = None
+        self.echo_end = None
+        self.pings = 0
+        self.trig_state = trig_pin.value()
+        trig_pin.watchers.append(self._on_trig)
+        echo_pin.source = self._echo
+
+    def _on_trig(self, value):
+        if (self.trig_state == 1 and value == 0):
+            self.pings += 1
+            dist = self.distance_fn(clock.now_us)
+            if (dist is None or dist < 0):
+                self.echo_start = None
+            elif (dist > self.MAX_RANGE_CM):
+                self.echo_start = clock.now_us + self.ECHO_DELAY_US
+                self.echo_end = self.echo_start + self.OUT_OF_RANGE_US
+            else:
+                self.echo_start = clock.now_us + self.ECHO_DELAY_US
+                self.echo_end = self.echo_start + int(dist*58)
+        self.trig_state = value
+
+    def _echo(self):
+        if (self.echo_start is None):
+            return 0
+        return 1 if self.echo_start <= clock.now_us < self.echo_end else 0
+
+
+#Purpose of this class is to measure how long motors are driven
+#Motor counts as on when PWM duty of its enable pin is above zero
+class MotorMonitor:
+    def __init__(self, motors):
+        self.motors = motors
+        self.on_us = [0 for m in motors]
+        self.any_on_us = 0
+        clock.listeners.append(self._update)
+
+    def _update(self, now_us, dt_us):
+        on = False
+        for i in range(len(self.motors)):
+            if (self.motors[i].en_pin.duty_u16() > 0):
+                self.on_us[i] += dt_us
+                on = True
+        if (on):
+            self.any_on_us += dt_us
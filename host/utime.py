@@ -0,0 +1,30 @@
+#Stand-in for MicroPython utime module, backed by virtual clock in host/sim.py
+
+import sim
+
+
+def ticks_us():
+    sim.clock.advance(sim.TICKS_COST_US)
+    return sim.clock.now_us
+
+def ticks_ms():
+    sim.clock.advance(sim.TICKS_COST_US)
+    return sim.clock.now_us // 1000
+
+def ticks_diff(a, b):
+    return a - b
+
+def ticks_add(a, b):
+    return a + b
+
+def sleep_us(us):
+    sim.clock.advance(int(us))
+
+def sleep_ms(ms):
+    sim.clock.advance(int(ms*1000))
+
+def sleep(s):
+    sim.clock.advance(int(s*1000000))
+
+def time():
+    return sim.clock.now_us // 1000000
@@ -1,5 +1,15 @@
-from machine import Pin, I2C, PWM, RTC
+from machine import Pin, I2C, PWM, RTC, UART
+import machine
 import utime
+import protocol
+import sensor_trace
+import selftest
+from display_power import DisplayPower
+from obstacle_map import ObstacleMap
+from diagnostics import test_motors, test_ultrasonic, test_buzzer
+
+#Set to file name (e.g. "trace.bin") to capture buttons, ultrasonic and clock trace for host/replay.py
+TRACE_PATH = None
 
 #Purpose of this class is to provide abstraction for LCD
 class LCD:
@@ -8,6 +18,8 @@ class LCD:
         self.addr = addr
         self.rows = rows
         self.cols = cols
+        self.backlight = 0x08 #PCF8574 P3 drives backlight transistor, it is sent with every byte
+        self.display_on = True
         self.init()
     
     def init(self):
@@ -16,14 +28,24 @@ class LCD:
             utime.sleep_ms(2)
     
     def cmd(self, cmd, mode=0):
-        high = mode | (cmd & 0xF0) | 0x08
-        low = mode | ((cmd << 4) & 0xF0) | 0x08
+        high = mode | (cmd & 0xF0) | self.backlight
+        low = mode | ((cmd << 4) & 0xF0) | self.backlight
         for val in [high | 4, high, low | 4, low]:
             self.i2c.writeto(self.addr, bytes([val]))
             utime.sleep_us(10)
             
         utime.sleep_ms(2)
     
+    #Turns backlight on or off, backpack can only switch it so there are no dimming levels
+    def set_backlight(self, on):
+        self.backlight = 0x08 if on else 0x00
+        self.i2c.writeto(self.addr, bytes([self.backlight]))
+    
+    #Turns display on (0x0C) or off (0x08), content is kept in display memory while off
+    def set_display(self, on):
+        self.display_on = on
+        self.cmd(0x0C if on else 0x08)
+    
     #Moves cursor
     def move_to(self, col, row):
         addr_begin = [0, 64, 20, 84] #I have no idea where these come from, but these works with 4x20 display
@@ -63,10 +85,12 @@ class Motor:
        self.en_pin = PWM(en_pin);
        self.pin0 = pin0;
        self.pin1 = pin1;
+       self.val = 0.0
        self.en_pin.freq(512)
        
     def drive(self, val): #1.0 full forward, -1.0 full backward, 0.0 off
         print("Motor drive {}".format(val))
+        self.val = val
         pwm = 0
         if (val >= 0):
             pwm = int(65536*val)
@@ -85,16 +109,19 @@ class Buzzer:
     def __init__(self, buzzer_pin):
         self.pin = PWM(buzzer_pin)
         self.freq = 3000
+        self.is_on = False
         
     def set_freq(self, f): #sets frequency
         self.freq = f
         
     def on(self):
         print("buzzer on")
+        self.is_on = True
         self.pin.freq(self.freq)
         self.pin.duty_u16(int(0.5*65536))
     def off(self):
         print("buzzer off")
+        self.is_on = False
         self.pin.duty_u16(0)
 
 #Purpose of this class is to provide abstraction for ultrasonic sensor
@@ -218,9 +245,41 @@ def set_clock(rtc, new_hours, new_minutes, new_seconds):
     
     rtc.datetime((year, month, day, weekday, new_hours, new_minutes, new_seconds, subseconds))
     
+#Draws clock view, alarm time is shown when alarm is given
+def draw_clock(lcd, hours, minutes, seconds, alarm=None):
+    lcd.clear()
+    lcd.move_to(0, 0)
+    lcd.putstr("Time:  {:02d}:{:02d}:{:02d}".format(hours, minutes, seconds))
+    if (alarm is not None):
+        lcd.move_to(0, 1)
+        lcd.putstr("Alarm: {:02d}:{:02d}:{:02d}".format(alarm[0], alarm[1], alarm[2]))
+
+
+#Sends telemetry frame with latest sonar reading and motor state to host
+def send_telemetry(link, dist, motor0, motor1, buzzer, alarm_active):
+    flags = 0
+    if (alarm_active):
+        flags |= protocol.FLAG_ALARM
+    if (buzzer.is_on):
+        flags |= protocol.FLAG_BUZZER
+    dist_mm = int(dist*10) if dist >= 0 else -1
+    link.send(protocol.CMD_TELEMETRY, 0, protocol.FMT_TELEMETRY, utime.ticks_ms() & 0xFFFFFFFF,
+              min(dist_mm, 32767), int(motor0.val*100), int(motor1.val*100), flags)
+
+#Returns True when it is time to send next telemetry frame
+def telemetry_due(link):
+    if (link is None or link.stream_period_ms == 0):
+        return False
+    now = utime.ticks_ms()
+    if (utime.ticks_diff(now, link.last_stream) < link.stream_period_ms):
+        return False
+    link.last_stream = now
+    return True
 
 #Purpose of this function is to perform alarming action
-def alarm_action(lcd, buttons, buzzer, motor0, motor1, sonic):
+#If link is given, telemetry is streamed while alarm is running
+#If obstacle map is given, robot turns towards most open direction, otherwise turning direction alternates
+def alarm_action(lcd, buttons, buzzer, motor0, motor1, sonic, link=None, obstacles=None):
     
     turn_right = True
     
@@ -235,26 +294,39 @@ def alarm_action(lcd, buttons, buzzer, motor0, motor1, sonic):
         motor0.drive(0.0)
         motor1.drive(0.0)
         
+        #Missed echo (-1) is treated as blocked below, but it is not stored to map as it tells nothing about direction
         dist = sonic.get_distance_cm()
+        if (obstacles is not None and dist >= 0):
+            obstacles.add(dist, utime.ticks_ms())
+        if (telemetry_due(link)):
+            send_telemetry(link, dist, motor0, motor1, buzzer, True)
+            
         if (dist < 40):
             
             buzzer.on()
             
-            if (turn_right):
-                motor0.drive(1.0)
-                motor1.drive(-1.0)
+            if (obstacles is not None):
+                direction, turn_ms = obstacles.best_turn(utime.ticks_ms())
+            elif (turn_right):
+                direction, turn_ms = (1, 333)
                 turn_right = False
             else:
-                motor1.drive(1.0)
-                motor0.drive(-1.0)
+                direction, turn_ms = (-1, 333)
                 turn_right = True
+            
+            #direction 1 turns right (motor0 forward, motor1 backward), -1 turns left
+            motor0.drive(1.0*direction)
+            motor1.drive(-1.0*direction)
                 
-            utime.sleep_ms(333)
+            utime.sleep_ms(turn_ms)
             
             buzzer.off()
             
             motor0.drive(0.0)
             motor1.drive(0.0)
+            
+            if (obstacles is not None):
+                obstacles.turned(turn_ms, direction)
     
     while (buttons.any_pressed()):
         utime.sleep_ms(10)
@@ -274,18 +346,45 @@ def main():
     sonic = Ultrasonic(machine.Pin(15, Pin.OUT), machine.Pin(14, Pin.IN))
 
     rtc = machine.RTC()
+    
+    #Binary command protocol is served over UART0 (GP0 TX, GP1 RX), see protocol.py
+    link = protocol.Link(UART(0, baudrate=115200, tx=machine.Pin(0), rx=machine.Pin(1), timeout=0))
+    
+    #In capture mode devices are wrapped so that everything firmware reads is also written to trace
+    recorder = None
+    if (TRACE_PATH is not None):
+        recorder = sensor_trace.TraceRecorder(TRACE_PATH)
+        buttons.pins = [sensor_trace.RecordingPin(buttons.pins[i], recorder, i) for i in range(3)]
+        sonic = sensor_trace.RecordingUltrasonic(sonic, recorder)
+        rtc = sensor_trace.RecordingRTC(rtc, recorder)
+    
+    #Headless self-test is run at boot when it has been requested, see selftest.py
+    if (selftest.requested()):
+        report = selftest.run(i2c, lcd, buttons, motor0, motor1, buzzer, sonic)
+        selftest.print_report(report)
+        selftest.save_report(report)
+        selftest.show_summary(lcd, report)
+        utime.sleep_ms(2000)
         
+    #Backlight is switched off after inactivity and whole display at night, see display_power.py
+    power = DisplayPower(lcd)
+    
     alarm_enabled = False
     alarm_hours, alarm_minutes, alarm_seconds = (0, 0, 0)
     
     prev_time = (0, 0, 0)
+    needs_redraw = True
     
     while True:
         hours, minutes, seconds = get_clock(rtc)
-        needs_redraw = False
+        
+        #If display is sleeping, button press only wakes it up
+        if (buttons.any_pressed() and power.wake()):
+            buttons.wait_for_input()
+            needs_redraw = True
         
         #If any buttons are pressed, enter UI menu
-        if (buttons.any_pressed()):
+        elif (buttons.any_pressed()):
             buttons.wait_for_input()
             
             #User can set alarm, disable alarm or set time
@@ -308,25 +407,112 @@ def main():
                 alarm_hours, alarm_minutes, alarm_seconds = time_dialog(lcd, buttons, alarm_hours, alarm_minutes, alarm_seconds, show_str="Set alarm: ")
                 alarm_enabled = True
                 
+            #Time spent in menu counts as activity
+            power.wake()
             needs_redraw = True
+        
+        #Serve remote commands, poll handles bounded amount of bytes so clock tick is not stalled
+        if (link.poll()):
+            cmd = link.cmd
+            if (cmd == protocol.CMD_PING):
+                link.respond(protocol.FMT_STATUS, protocol.STATUS_OK)
+                
+            elif (cmd == protocol.CMD_GET_STATUS):
+                link.respond(protocol.FMT_STATUS_RESPONSE, protocol.STATUS_OK, hours, minutes, seconds,
+                             int(alarm_enabled), alarm_hours, alarm_minutes, alarm_seconds)
+                
+            elif (cmd == protocol.CMD_SET_TIME or cmd == protocol.CMD_SET_ALARM):
+                values = link.unpack(protocol.FMT_TIME)
+                if (values is None):
+                    link.respond(protocol.FMT_STATUS, protocol.STATUS_BAD_LENGTH)
+                elif (values[0] >= 24 or values[1] >= 60 or values[2] >= 60):
+                    link.respond(protocol.FMT_STATUS, protocol.STATUS_BAD_VALUE)
+                else:
+                    if (cmd == protocol.CMD_SET_TIME):
+                        hours, minutes, seconds = values
+                        set_clock(rtc, hours, minutes, seconds)
+                    else:
+                        alarm_hours, alarm_minutes, alarm_seconds = values
+                        alarm_enabled = True
+                    link.respond(protocol.FMT_STATUS, protocol.STATUS_OK)
+                    needs_redraw = True
+                    
+            elif (cmd == protocol.CMD_DISABLE_ALARM):
+                alarm_enabled = False
+                link.respond(protocol.FMT_STATUS, protocol.STATUS_OK)
+                needs_redraw = True
+                
+            elif (cmd == protocol.CMD_RUN_TEST):
+                values = link.unpack(protocol.FMT_TEST)
+                result = 0
+                status = protocol.STATUS_OK
+                if (values is None):
+                    status = protocol.STATUS_BAD_LENGTH
+                elif (values[0] == protocol.TEST_MOTORS):
+                    test_motors(lcd, motor0, motor1)
+                elif (values[0] == protocol.TEST_ULTRASONIC):
+                    dist = test_ultrasonic(lcd, sonic)
+                    result = int(dist*10) if dist >= 0 else -1
+                elif (values[0] == protocol.TEST_BUZZER):
+                    test_buzzer(buzzer)
+                elif (values[0] == protocol.TEST_SELFTEST):
+                    report = selftest.run(i2c, lcd, buttons, motor0, motor1, buzzer, sonic)
+                    selftest.save_report(report)
+                    result = len(report["failed"])
+                else:
+                    status = protocol.STATUS_BAD_VALUE
+                link.respond(protocol.FMT_TEST_RESPONSE, status, min(result, 32767))
+                needs_redraw = True
+                
+            elif (cmd == protocol.CMD_GET_POWER):
+                r = power.report()
+                link.respond(protocol.FMT_POWER_RESPONSE, protocol.STATUS_OK, r["backlight_s"], r["display_s"],
+                             r["prev_backlight_s"], r["prev_display_s"])
+                
+            elif (cmd == protocol.CMD_SET_STREAM):
+                values = link.unpack(protocol.FMT_STREAM)
+                if (values is None):
+                    link.respond(protocol.FMT_STATUS, protocol.STATUS_BAD_LENGTH)
+                elif (values[0] != 0 and values[0] < protocol.MIN_STREAM_PERIOD_MS):
+                    link.respond(protocol.FMT_STATUS, protocol.STATUS_BAD_VALUE)
+                else:
+                    link.stream_period_ms = values[0]
+                    link.last_stream = utime.ticks_ms()
+                    link.respond(protocol.FMT_STATUS, protocol.STATUS_OK)
+                    
+            else:
+                link.respond(protocol.FMT_STATUS, protocol.STATUS_UNKNOWN_CMD)
+        
+        if (telemetry_due(link)):
+            send_telemetry(link, sonic.get_distance_cm(), motor0, motor1, buzzer, False)
                 
         if (prev_time != (hours, minutes, seconds)):
             prev_time = (hours, minutes, seconds)
             #Time is different than in previous step, display needs to be updated
             needs_redraw = True
         
+        power.update(hours, minutes, seconds)
+        
         #To avoid flickering, content of display is updated only when something have changed
-        if (needs_redraw):
-            lcd.clear()
-            lcd.move_to(0, 0)
-            lcd.putstr("Time:  {:02d}:{:02d}:{:02d}".format(hours, minutes, seconds))
-            if (alarm_enabled):
-                lcd.move_to(0, 1)
-                lcd.putstr("Alarm: {:02d}:{:02d}:{:02d}".format(alarm_hours, alarm_minutes, alarm_seconds))
+        #While display is off nothing is drawn, it is redrawn when display wakes up
+        if (needs_redraw and lcd.display_on):
+            draw_clock(lcd, hours, minutes, seconds, (alarm_hours, alarm_minutes, alarm_seconds) if alarm_enabled else None)
+            needs_redraw = False
             
         if alarm_enabled and (hours, minutes, seconds) == (alarm_hours, alarm_minutes, alarm_seconds):
-            alarm_action(lcd, buttons, buzzer, motor0, motor1, sonic);
+            if (recorder is not None):
+                recorder.record(sensor_trace.EV_ALARM_START, alarm_hours*3600 + alarm_minutes*60 + alarm_seconds)
+            #Display may have been off for hours, current time is drawn before alarm blocks the loop
+            if (power.wake()):
+                draw_clock(lcd, hours, minutes, seconds, (alarm_hours, alarm_minutes, alarm_seconds))
+            alarm_action(lcd, buttons, buzzer, motor0, motor1, sonic, link, ObstacleMap());
+            if (recorder is not None):
+                recorder.record(sensor_trace.EV_ALARM_END, 0)
+                recorder.flush()
             alarm_enabled = False  
+            #Button press which stopped alarm counts as activity
+            power.wake()
+            needs_redraw = True
             
         utime.sleep_ms(10)
         
@@ -0,0 +1,83 @@
+from array import array
+import utime
+
+#Purpose of this module is to remember obstacles around robot while alarm is running
+#Distances are stored into fixed number of angular bins by estimated heading. Heading is dead-reckoned
+#from how long robot has been turning, so it drifts, and old readings are trusted less as they get older.
+#Only integers and preallocated arrays are used, so updating does not allocate memory.
+
+BINS = 16
+MAX_RANGE_CM = 200
+UNKNOWN_CM = 80 #value for directions which have not been measured or have been forgotten
+DECAY_MS = 15000 #after this time reading has decayed completely to UNKNOWN_CM
+TURN_RATE_DEG_S = 180 #turning speed with motors full opposite, needs calibration for each robot
+TURN_PENALTY_CM_PER_DEG = 0.25 #small turns are preferred when directions are almost equally open
+MIN_TURN_MS = 60
+
+FULL_TURN = 360000 #heading is kept in millidegrees
+
+
+#Purpose of this class is to provide angular occupancy map and to choose direction for escaping
+#Heading grows when robot turns right (motor0 forward, motor1 backward)
+class ObstacleMap:
+    def __init__(self, bins=BINS, turn_rate=TURN_RATE_DEG_S, decay_ms=DECAY_MS):
+        self.bins = bins
+        self.turn_rate = turn_rate
+        self.decay_ms = decay_ms
+        self.heading = 0
+        self.dist = array("h", [UNKNOWN_CM] * bins)
+        self.stamp = array("i", [0] * bins)
+        self.seen = bytearray(bins)
+        self.penalty = int(TURN_PENALTY_CM_PER_DEG * 360 / bins) #per bin of turning
+
+    #Bin which robot is currently facing
+    def current_bin(self):
+        return ((self.heading * self.bins + FULL_TURN // 2) // FULL_TURN) % self.bins
+
+    #Updates heading after turning for dt_ms, direction is 1 for right and -1 for left
+    def turned(self, dt_ms, direction):
+        self.heading = (self.heading + direction * dt_ms * self.turn_rate) % FULL_TURN
+
+    #Stores distance measured to current heading, distance over MAX_RANGE_CM means that direction is open
+    #Missed echo (-1) is sensor fault which tells nothing about the direction, so it must not be added
+    def add(self, dist_cm, now_ms):
+        b = self.current_bin()
+        if (dist_cm > MAX_RANGE_CM):
+            self.dist[b] = MAX_RANGE_CM
+        else:
+            self.dist[b] = int(dist_cm)
+        self.stamp[b] = now_ms
+        self.seen[b] = 1
+
+    #Distance of bin after decay, old readings move linearly towards UNKNOWN_CM
+    def distance(self, b, now_ms):
+        if (not self.seen[b]):
+            return UNKNOWN_CM
+        age = utime.ticks_diff(now_ms, self.stamp[b])
+        if (age >= self.decay_ms):
+            self.seen[b] = 0
+            return UNKNOWN_CM
+        d = self.dist[b]
+        return d + (UNKNOWN_CM - d) * age // self.decay_ms
+
+    #Chooses most open direction, current direction is excluded because robot is blocked there
+    #Returns (direction, turn time in ms), direction is 1 for right and -1 for left
+    def best_turn(self, now_ms):
+        cur = self.current_bin()
+        half = self.bins // 2
+        best_score = -1000000
+        best_k = half
+        for k in range(1, self.bins):
+            steps = k if k <= half else self.bins - k
+            score = self.distance((cur + k) % self.bins, now_ms) - steps * self.penalty
+            if (score > best_score):
+                best_score = score
+                best_k = k
+        if (best_k <= half):
+            direction = 1
+            steps = best_k
+        else:
+            direction = -1
+            steps = self.bins - best_k
+        turn_ms = steps * FULL_TURN // self.bins // self.turn_rate
+        return (direction, max(turn_ms, MIN_TURN_MS))
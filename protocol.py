@@ -0,0 +1,294 @@
+import struct
+try:
+    import utime
+except ImportError:
+    #Host client uses only framing functions, Link is used on device (or with host simulator)
+    utime = None
+
+#Purpose of this module is to provide compact binary command protocol for remote control and telemetry
+#Same module is used by firmware (MicroPython) and by host client (CPython), framing needs only struct
+#
+#Frame layout:
+#  0xA5 0x5A LEN CMD REQ_ID DATA... CRC_LO CRC_HI
+#LEN counts CMD, REQ_ID and DATA bytes. CRC is CRC16-CCITT (0xFFFF init) calculated over LEN..DATA.
+#Responses use request command with RESPONSE bit set and same REQ_ID, first data byte is status.
+
+SYNC0 = 0xA5
+SYNC1 = 0x5A
+MAX_PAYLOAD = 32
+MAX_FRAME = MAX_PAYLOAD + 5
+
+#Commands from host to device
+CMD_PING = 0x01
+CMD_GET_STATUS = 0x02
+CMD_SET_TIME = 0x03
+CMD_SET_ALARM = 0x04
+CMD_DISABLE_ALARM = 0x05
+CMD_RUN_TEST = 0x06
+CMD_SET_STREAM = 0x07
+CMD_GET_POWER = 0x08
+
+#Unsolicited frames from device to host
+CMD_TELEMETRY = 0x40
+
+RESPONSE = 0x80
+
+STATUS_OK = 0
+STATUS_BAD_LENGTH = 1
+STATUS_BAD_VALUE = 2
+STATUS_UNKNOWN_CMD = 3
+
+#Diagnostics which can be triggered with CMD_RUN_TEST (see diagnostics.py and selftest.py)
+TEST_MOTORS = 0
+TEST_ULTRASONIC = 1
+TEST_BUZZER = 2
+TEST_SELFTEST = 3 #result is number of failed tests, full report is saved to selftest.json on device
+
+#Payload formats
+FMT_STATUS = "<B"
+FMT_TIME = "<BBB"
+FMT_STATUS_RESPONSE = "<BBBBBBBB" #status, hours, minutes, seconds, alarm enabled, alarm hours, alarm minutes, alarm seconds
+FMT_TEST = "<B"
+FMT_TEST_RESPONSE = "<Bh" #status, result (distance in mm for ultrasonic test, failed count for self-test)
+FMT_POWER_RESPONSE = "<BIIII" #status, backlight and display on-time today, same for previous day (seconds)
+FMT_STREAM = "<H" #period in ms, 0 disables streaming
+FMT_TELEMETRY = "<IhbbB" #ticks_ms, distance in mm (-1 if no echo), motor0 %, motor1 %, flags
+FLAG_ALARM = 0x01
+FLAG_BUZZER = 0x02
+
+#Every telemetry frame pings ultrasonic sensor, HC-SR04 needs about 60 ms for previous echoes to fade
+MIN_STREAM_PERIOD_MS = 60
+
+#Frame which has not been completed after this long since last received byte is dropped
+FRAME_TIMEOUT_MS = 20
+
+_WAIT_SYNC0 = 0
+_WAIT_SYNC1 = 1
+_WAIT_LEN = 2
+_WAIT_BODY = 3
+_WAIT_CRC_LO = 4
+_WAIT_CRC_HI = 5
+
+
+def crc16_update(crc, byte):
+    crc ^= byte << 8
+    for _ in range(8):
+        if (crc & 0x8000):
+            crc = ((crc << 1) ^ 0x1021) & 0xFFFF
+        else:
+            crc = (crc << 1) & 0xFFFF
+    return crc
+
+def crc16(data, crc=0xFFFF):
+    for b in data:
+        crc = crc16_update(crc, b)
+    return crc
+
+
+#Writes frame into preallocated buffer and returns its length
+#Data is packed directly into the buffer with struct format so no temporary objects are needed
+def pack_frame(buf, cmd, req_id, fmt="", *values):
+    size = struct.calcsize(fmt) if fmt else 0
+    if (size > MAX_PAYLOAD - 2):
+        raise ValueError("payload too long")
+    buf[0] = SYNC0
+    buf[1] = SYNC1
+    buf[2] = size + 2
+    buf[3] = cmd
+    buf[4] = req_id & 0xFF
+    if (size):
+        struct.pack_into(fmt, buf, 5, *values)
+    crc = 0xFFFF
+    for i in range(2, 5 + size):
+        crc = crc16_update(crc, buf[i])
+    buf[5 + size] = crc & 0xFF
+    buf[6 + size] = crc >> 8
+    return 7 + size
+
+#Convenience version for host side, returns frame as bytes
+def encode_frame(cmd, req_id, fmt="", *values):
+    buf = bytearray(MAX_FRAME)
+    n = pack_frame(buf, cmd, req_id, fmt, *values)
+    return bytes(buf[:n])
+
+
+#Purpose of this class is to parse frames incrementally, one byte at a time
+#Bytes of frame being received are kept in preallocated buffer, so parsing never allocates memory.
+#If frame turns out to be broken (bad length or CRC, or it was aborted), parsing starts again from
+#the byte after its SYNC0, so a valid frame hidden inside garbage or after truncated frame is not lost.
+class FrameParser:
+    def __init__(self):
+        self.buf = bytearray(MAX_PAYLOAD) #CMD, REQ_ID and DATA of last valid frame
+        self.raw = bytearray(MAX_FRAME) #received bytes starting from SYNC0 of current candidate frame
+        self.count = 0
+        self.pos = 0
+        self.length = 0
+        self.errors = 0
+        self.reset()
+
+    def reset(self):
+        self.state = _WAIT_SYNC0
+        self.index = 0
+        self.crc = 0xFFFF
+
+    #Returns True when part of frame has been received but frame is not complete
+    def in_frame(self):
+        return self.state != _WAIT_SYNC0
+
+    #Feeds one byte to parser, returns True when valid frame has been received
+    def push(self, b):
+        if (self.count >= len(self.raw)):
+            #Cannot happen with valid LEN, but never write past the buffer
+            self._drop(1)
+        self.raw[self.count] = b
+        self.count += 1
+        return self.process()
+
+    #Parses bytes which have not been parsed yet, returns True when valid frame has been found
+    #Bytes after the frame stay in buffer, so this should be called again before feeding more bytes
+    def process(self):
+        while (self.pos < self.count):
+            b = self.raw[self.pos]
+            self.pos += 1
+            result = self._step(b)
+            if (result > 0):
+                self._drop(self.pos)
+                return True
+            if (result < 0):
+                self._rescan()
+        if (self.state == _WAIT_SYNC0):
+            #Nothing here can start a frame anymore
+            self._drop(self.pos)
+        return False
+
+    #Gives up current frame (e.g. when sender has stopped in the middle of it) and rescans its bytes
+    def abort(self):
+        if (not self.in_frame()):
+            return False
+        self._rescan()
+        return self.process()
+
+    def _rescan(self):
+        self.errors += 1
+        self.reset()
+        #Candidate frame always starts at raw[0], its SYNC0 is dropped and rest is parsed again
+        self._drop(1)
+        self.pos = 0
+
+    def _drop(self, n):
+        n = min(n, self.count)
+        raw = self.raw
+        for i in range(n, self.count):
+            raw[i - n] = raw[i]
+        self.count -= n
+        self.pos = max(0, self.pos - n)
+
+    def _step(self, b):
+        state = self.state
+        if (state == _WAIT_SYNC0):
+            if (b == SYNC0):
+                #Bytes before SYNC0 are garbage, so candidate frame starts from raw[0]
+                self._drop(self.pos - 1)
+                self.state = _WAIT_SYNC1
+        elif (state == _WAIT_SYNC1):
+            if (b == SYNC1):
+                self.state = _WAIT_LEN
+            elif (b == SYNC0):
+                self._drop(self.pos - 1)
+            else:
+                self.state = _WAIT_SYNC0
+        elif (state == _WAIT_LEN):
+            if (b < 2 or b > MAX_PAYLOAD):
+                return -1
+            self.length = b
+            self.index = 0
+            self.crc = crc16_update(0xFFFF, b)
+            self.state = _WAIT_BODY
+        elif (state == _WAIT_BODY):
+            self.buf[self.index] = b
+            self.index += 1
+            self.crc = crc16_update(self.crc, b)
+            if (self.index >= self.length):
+                self.state = _WAIT_CRC_LO
+        elif (state == _WAIT_CRC_LO):
+            if (b != self.crc & 0xFF):
+                return -1
+            self.state = _WAIT_CRC_HI
+        else:
+            if (b != self.crc >> 8):
+                return -1
+            self.reset()
+            return 1
+        return 0
+
+    @property
+    def cmd(self):
+        return self.buf[0]
+
+    @property
+    def req_id(self):
+        return self.buf[1]
+
+    @property
+    def data_len(self):
+        return self.length - 2
+
+    #Unpacks frame data with struct format, returns None if data length does not match
+    def unpack(self, fmt):
+        if (struct.calcsize(fmt) != self.length - 2):
+            return None
+        return struct.unpack_from(fmt, self.buf, 2)
+
+
+#Purpose of this class is to serve protocol over byte stream without blocking main loop
+#Stream must provide any(), readinto(buf, nbytes) and write(buf) like machine.UART does
+class Link:
+    def __init__(self, stream, rx_size=16):
+        self.stream = stream
+        self.parser = FrameParser()
+        self.rx = bytearray(rx_size)
+        self.rx_pos = 0
+        self.rx_len = 0
+        self.last_rx = utime.ticks_ms()
+        self.tx = bytearray(MAX_FRAME)
+        self.stream_period_ms = 0
+        self.last_stream = 0
+
+    #Processes at most one chunk of received bytes and returns True when complete frame is available
+    #Remaining bytes are kept for next call, so each call takes bounded time
+    def poll(self):
+        parser = self.parser
+        if (parser.process()):
+            return True
+        if (self.rx_pos >= self.rx_len):
+            available = self.stream.any()
+            if (not available):
+                #Sender stopped in the middle of frame, drop it so that next request is not swallowed
+                if (parser.in_frame() and utime.ticks_diff(utime.ticks_ms(), self.last_rx) > FRAME_TIMEOUT_MS):
+                    return parser.abort()
+                return False
+            n = self.stream.readinto(self.rx, min(available, len(self.rx)))
+            self.rx_pos = 0
+            self.rx_len = n or 0
+            self.last_rx = utime.ticks_ms()
+        while (self.rx_pos < self.rx_len):
+            b = self.rx[self.rx_pos]
+            self.rx_pos += 1
+            if (parser.push(b)):
+                return True
+        return False
+
+    @property
+    def cmd(self):
+        return self.parser.cmd
+
+    def unpack(self, fmt):
+        return self.parser.unpack(fmt)
+
+    def send(self, cmd, req_id, fmt="", *values):
+        n = pack_frame(self.tx, cmd, req_id, fmt, *values)
+        self.stream.write(memoryview(self.tx)[:n])
+
+    #Sends response to last received frame
+    def respond(self, fmt="", *values):
+        self.send(self.parser.cmd | RESPONSE, self.parser.req_id, fmt, *values)
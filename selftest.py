@@ -0,0 +1,206 @@
+import json
+import os
+import utime
+
+#Purpose of this module is to test hardware without user interaction and measure timings
+#Report is dictionary (printed as JSON) with measurements and pass/fail for every peripheral.
+#Runs on device (from test.py, at boot or with protocol command) and on PC against host simulator.
+
+LCD_ADDR = 0x27
+RTC_ADDR = 0x68
+
+#If this file exists at boot, main.py runs self-test and deletes the file
+REQUEST_FILE = "selftest.req"
+REPORT_FILE = "selftest.json"
+
+#HC-SR04 measures up to 4 m, longer distance means that nothing was in range, which is valid reading
+SONAR_RANGE_CM = 400
+
+THRESHOLDS = {
+    "i2c_rtt_max_us": 1000, #single small transfer, 100-400 kHz bus
+    "lcd_min_cmds_per_s": 200,
+    "sonar_latency_max_us": 100000, #Ultrasonic.get_distance_cm gives up after 100 ms, echo with nothing in range lasts about 38 ms
+    "sonar_stdev_max_cm": 1.0,
+    "sonar_max_timeouts": 0,
+    "button_read_max_us": 200,
+    "motor_cmd_max_us": 2000,
+}
+
+
+def _stats(samples):
+    n = len(samples)
+    if (n == 0):
+        return (0, 0, 0, 0)
+    mean = sum(samples) / n
+    var = sum((s - mean)*(s - mean) for s in samples) / n
+    return (mean, var ** 0.5, min(samples), max(samples))
+
+
+#Measures round trip time of small transfers to I2C device, device missing counts as error
+def test_i2c(i2c, addr, count=20):
+    times = []
+    errors = 0
+    for i in range(count):
+        start = utime.ticks_us()
+        try:
+            if (addr == LCD_ADDR):
+                i2c.writeto(addr, bytes([0x08])) #only backlight bit, enable stays low so LCD ignores it
+            else:
+                i2c.readfrom_mem(addr, 0x00, 1)
+        except OSError:
+            errors += 1
+            continue
+        times.append(utime.ticks_diff(utime.ticks_us(), start))
+    mean, stdev, low, high = _stats(times)
+    return {
+        "addr": addr,
+        "count": count,
+        "errors": errors,
+        "rtt_mean_us": mean,
+        "rtt_max_us": high,
+        "pass": errors == 0 and high <= THRESHOLDS["i2c_rtt_max_us"],
+    }
+
+#Measures how many LCD commands per second can be written, bottom row is overwritten
+def test_lcd(lcd, count=40):
+    text = "LCD speed test      "
+    start = utime.ticks_us()
+    written = 0
+    try:
+        while (written < count):
+            lcd.move_to(0, lcd.rows - 1)
+            lcd.putstr(text[:lcd.cols])
+            written += 1 + min(len(text), lcd.cols)
+    except OSError:
+        return {"cmds": written, "cmds_per_s": 0, "pass": False}
+    elapsed = utime.ticks_diff(utime.ticks_us(), start)
+    rate = written * 1000000 / elapsed if elapsed > 0 else 0
+    return {
+        "cmds": written,
+        "cmds_per_s": rate,
+        "pass": rate >= THRESHOLDS["lcd_min_cmds_per_s"],
+    }
+
+#Pings ultrasonic sensor count times, measures latency of each ping and variance of distance
+#Only missed echoes (timeouts) are errors, test passes also when nothing is in front of the robot
+def test_sonar(sonic, count=10, interval_ms=60):
+    latencies = []
+    distances = []
+    timeouts = 0
+    out_of_range = 0
+    for i in range(count):
+        start = utime.ticks_us()
+        dist = sonic.get_distance_cm()
+        latencies.append(utime.ticks_diff(utime.ticks_us(), start))
+        if (dist < 0):
+            timeouts += 1
+        elif (dist > SONAR_RANGE_CM):
+            out_of_range += 1
+        else:
+            distances.append(dist)
+        #Sensor needs time for previous echoes to fade
+        utime.sleep_ms(interval_ms)
+    lat_mean, lat_stdev, lat_min, lat_max = _stats(latencies)
+    mean, stdev, low, high = _stats(distances)
+    return {
+        "count": count,
+        "timeouts": timeouts,
+        "out_of_range": out_of_range,
+        "latency_mean_us": lat_mean,
+        "latency_max_us": lat_max,
+        "distance_mean_cm": mean,
+        "distance_stdev_cm": stdev,
+        "pass": (timeouts <= THRESHOLDS["sonar_max_timeouts"] and lat_max <= THRESHOLDS["sonar_latency_max_us"]
+                 and stdev <= THRESHOLDS["sonar_stdev_max_cm"]),
+    }
+
+#Samples buttons for given time, nothing should be pressed during headless test
+#Read latency tells how fast Buttons.wait_for_input can notice a click
+def test_buttons(buttons, duration_ms=50):
+    stuck = [False, False, False]
+    reads = []
+    start = utime.ticks_ms()
+    while (utime.ticks_diff(utime.ticks_ms(), start) < duration_ms):
+        for i in range(3):
+            t = utime.ticks_us()
+            pressed = buttons.is_button_pressed(i)
+            reads.append(utime.ticks_diff(utime.ticks_us(), t))
+            if (pressed):
+                stuck[i] = True
+        utime.sleep_ms(1)
+    mean, stdev, low, high = _stats(reads)
+    return {
+        "stuck": stuck,
+        "read_mean_us": mean,
+        "read_max_us": high,
+        "pass": not any(stuck) and high <= THRESHOLDS["button_read_max_us"],
+    }
+
+#Drives both motors shortly to both directions and measures how long one drive command takes
+def test_motors(motor0, motor1, pulse_ms=100):
+    times = []
+    for motor in [motor0, motor1]:
+        for val in [1.0, -1.0, 0.0]:
+            start = utime.ticks_us()
+            motor.drive(val)
+            times.append(utime.ticks_diff(utime.ticks_us(), start))
+            if (val != 0.0):
+                utime.sleep_ms(pulse_ms)
+    mean, stdev, low, high = _stats(times)
+    return {
+        "cmd_mean_us": mean,
+        "cmd_max_us": high,
+        "pass": high <= THRESHOLDS["motor_cmd_max_us"],
+    }
+
+def test_buzzer(buzzer, beep_ms=50):
+    buzzer.on()
+    utime.sleep_ms(beep_ms)
+    buzzer.off()
+    return {"pass": True}
+
+
+#Runs all tests and returns report, motors can be skipped when robot is not allowed to move
+def run(i2c, lcd, buttons, motor0, motor1, buzzer, sonic, pings=10, motors=True):
+    start = utime.ticks_ms()
+    report = {
+        "i2c_lcd": test_i2c(i2c, LCD_ADDR),
+        "i2c_rtc": test_i2c(i2c, RTC_ADDR),
+        "lcd": test_lcd(lcd),
+        "sonar": test_sonar(sonic, pings),
+        "buttons": test_buttons(buttons),
+        "buzzer": test_buzzer(buzzer),
+    }
+    if (motors):
+        report["motors"] = test_motors(motor0, motor1)
+    failed = sorted(name for name in report if not report[name]["pass"])
+    report["failed"] = failed
+    report["pass"] = len(failed) == 0
+    report["duration_ms"] = utime.ticks_diff(utime.ticks_ms(), start)
+    report["thresholds"] = THRESHOLDS
+    return report
+
+def print_report(report):
+    print(json.dumps(report))
+
+def save_report(report, path=REPORT_FILE):
+    with open(path, "w") as f:
+        f.write(json.dumps(report))
+
+#Shows result on LCD, failed tests are listed on the rows below
+def show_summary(lcd, report):
+    lcd.clear()
+    lcd.move_to(0, 0)
+    lcd.putstr("Self-test: {}".format("PASS" if report["pass"] else "FAIL"))
+    for i in range(min(len(report["failed"]), lcd.rows - 1)):
+        lcd.move_to(0, i + 1)
+        lcd.putstr(report["failed"][i][:lcd.cols])
+
+#Returns True if self-test was requested with REQUEST_FILE, file is removed so test runs only once
+def requested():
+    try:
+        os.stat(REQUEST_FILE)
+    except OSError:
+        return False
+    os.remove(REQUEST_FILE)
+    return True
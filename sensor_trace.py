@@ -0,0 +1,175 @@
+import struct
+import utime
+
+#Purpose of this module is to capture timestamped sensor and button traces on the device
+#Traces are replayed on PC with host/replay.py, which gives reproducible runs of alarm_action etc.
+#
+#File layout: 4 byte magic followed by fixed size records (kind u8, time ms u32, value i32)
+
+MAGIC = b"TRC1"
+RECORD_FMT = "<BIi"
+RECORD_SIZE = struct.calcsize(RECORD_FMT)
+
+EV_BUTTON = 1 #value = button index << 1 | state
+EV_SONAR = 2 #value = distance in mm, -1 if echo was missed
+EV_RTC = 3 #value = seconds since midnight, recorded when clock is read first time, set or jumps
+EV_ALARM_START = 4 #value = alarm time as seconds since midnight
+EV_ALARM_END = 5
+EV_STOPPED = 6 #last record when recording stopped early, value = STOP_SIZE or STOP_TIME
+
+STOP_SIZE = 1 #max_bytes was reached
+STOP_TIME = 2 #record time does not fit into 32 bits anymore (about 49 days)
+
+#Clock is expected to run with ticks, difference bigger than this is recorded as jump
+RTC_JUMP_S = 2
+
+MAX_TRACE_BYTES = 256 * 1024
+
+
+#Purpose of this class is to collect records into RAM buffer and write them to flash in blocks
+#Writing to flash stalls the CPU, so buffer is flushed only when it gets full or when flush() is called.
+#Recording stops when max_bytes has been written or when writing fails (e.g. filesystem is full),
+#so capture mode can never crash the clock. Space for EV_STOPPED record is kept, so trace shows where it ends.
+class TraceRecorder:
+    def __init__(self, path, buffer_records=64, max_bytes=MAX_TRACE_BYTES):
+        self.buf = bytearray(RECORD_SIZE * buffer_records)
+        self.pos = 0
+        self.size = len(MAGIC)
+        self.max_bytes = max_bytes
+        self.stopped = False
+        #Time is accumulated from small tick differences, so it keeps growing when ticks wrap
+        self.last_ticks = utime.ticks_ms()
+        self.elapsed = 0
+        try:
+            self.file = open(path, "wb")
+            self.file.write(MAGIC)
+        except OSError:
+            self.file = None
+            self.stopped = True
+
+    #Records event, ticks can be given when event happened earlier than now (must not be older than previous record)
+    def record(self, kind, value, ticks=None):
+        if (self.stopped):
+            return
+        if (ticks is None):
+            ticks = utime.ticks_ms()
+        self.elapsed += max(0, utime.ticks_diff(ticks, self.last_ticks))
+        self.last_ticks = ticks
+        if (self.size + 2*RECORD_SIZE > self.max_bytes):
+            self.stop(STOP_SIZE)
+        elif (self.elapsed > 0xFFFFFFFF):
+            self.stop(STOP_TIME)
+        else:
+            self._append(kind, self.elapsed, value)
+
+    #Writes EV_STOPPED record and stops recording
+    def stop(self, reason):
+        if (self.stopped):
+            return
+        self._append(EV_STOPPED, min(self.elapsed, 0xFFFFFFFF), reason)
+        self.stopped = True
+        self.flush()
+        print("trace stopped: {}".format("size limit" if reason == STOP_SIZE else "time limit"))
+
+    def _append(self, kind, t, value):
+        struct.pack_into(RECORD_FMT, self.buf, self.pos, kind, t, value)
+        self.pos += RECORD_SIZE
+        self.size += RECORD_SIZE
+        if (self.pos >= len(self.buf)):
+            self.flush()
+
+    def flush(self):
+        if (self.file is None):
+            return
+        try:
+            if (self.pos):
+                self.file.write(memoryview(self.buf)[:self.pos])
+            self.file.flush()
+        except OSError:
+            if (not self.stopped):
+                print("trace stopped: write failed")
+            self.stopped = True
+        self.pos = 0
+
+    def close(self):
+        self.flush()
+        if (self.file is not None):
+            self.file.close()
+            self.file = None
+
+
+#Purpose of this class is to record edges of button pin
+#Edges are recorded when firmware reads the pin, so trace contains exactly what firmware saw
+class RecordingPin:
+    def __init__(self, pin, recorder, index):
+        self.pin = pin
+        self.recorder = recorder
+        self.index = index
+        self.last = pin.value()
+        recorder.record(EV_BUTTON, (index << 1) | self.last)
+
+    def value(self, *args):
+        if (args):
+            return self.pin.value(*args)
+        v = self.pin.value()
+        if (v != self.last):
+            self.last = v
+            self.recorder.record(EV_BUTTON, (self.index << 1) | v)
+        return v
+
+
+#Purpose of this class is to record every distance measured by ultrasonic sensor
+class RecordingUltrasonic:
+    def __init__(self, sonic, recorder):
+        self.sonic = sonic
+        self.recorder = recorder
+
+    #Sample is stamped with time when measurement started, replay looks distance up at trigger time
+    def get_distance_cm(self):
+        start = utime.ticks_ms()
+        dist = self.sonic.get_distance_cm()
+        self.recorder.record(EV_SONAR, int(dist*10) if dist >= 0 else -1, start)
+        return dist
+
+
+#Purpose of this class is to record clock time when it is set or when it jumps
+#Between records clock runs with record timestamps, so replay derives it from them and
+#one record per second is not needed (that alone would fill MAX_TRACE_BYTES in about 8 hours).
+class RecordingRTC:
+    def __init__(self, rtc, recorder):
+        self.rtc = rtc
+        self.recorder = recorder
+        self.base_secs = None
+        self.base_ticks = 0
+
+    def datetime(self, *args):
+        if (args):
+            self.rtc.datetime(*args)
+            dt = args[0]
+        else:
+            dt = self.rtc.datetime()
+        secs = dt[4]*3600 + dt[5]*60 + dt[6]
+        now = utime.ticks_ms()
+        if (self.base_secs is None or args):
+            jump = True
+        else:
+            expected = (self.base_secs + utime.ticks_diff(now, self.base_ticks) // 1000) % 86400
+            diff = abs(secs - expected)
+            jump = min(diff, 86400 - diff) > RTC_JUMP_S
+        if (jump):
+            self.base_secs = secs
+            self.base_ticks = now
+            self.recorder.record(EV_RTC, secs, now)
+        return None if args else dt
+
+
+#Reads trace file and returns list of (kind, time ms, value) tuples
+def read_trace(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    if (data[:len(MAGIC)] != MAGIC):
+        raise ValueError("not a trace file")
+    records = []
+    for pos in range(len(MAGIC), len(data) - RECORD_SIZE + 1, RECORD_SIZE):
+        records.append(struct.unpack_from(RECORD_FMT, data, pos))
+    return records
@@ -1,5 +1,8 @@
 from machine import Pin, I2C, PWM, RTC
+import machine
 import utime
+import selftest
+from diagnostics import test_motors, test_ultrasonic, test_buzzer
 
 class LCD:
     def __init__(self, i2c, addr, rows, cols):
@@ -207,7 +210,6 @@ def alarm_action(lcd, buttons, buzzer, motor0, motor1, sonic):
     while (buttons.any_pressed()):
         utime.sleep_ms(10)
         
-        
 
 def main():
     
@@ -223,6 +225,12 @@ def main():
 
     rtc = machine.RTC()
     
+    #Automated self-test is run first, manual tests are still available from the menu
+    report = selftest.run(i2c, lcd, buttons, motor0, motor1, buzzer, sonic)
+    selftest.print_report(report)
+    selftest.show_summary(lcd, report)
+    buttons.wait_for_input()
+    
     prev_time = (0, 0, 0)
     
     while True:
@@ -233,32 +241,18 @@ def main():
             buttons.wait_for_input()
             
             
-            choice = select_dialog(lcd, buttons, ["test motors", "test ultrasonic", "test buzzer", "exit"])
-            if (choice == "test motors"):
-                lcd.clear()
-                lcd.move_to(0, 0)
-                lcd.putstr("Testing motors")
-                
-                motor0.drive(1.0)
-                utime.sleep_ms(500)
-                motor0.drive(-1.0)
-                utime.sleep_ms(500)
-                motor0.drive(0.0)
-                motor1.drive(1.0)
-                utime.sleep_ms(500)
-                motor1.drive(-1.0)
-                utime.sleep_ms(500)
-                motor1.drive(0.0)
+            choice = select_dialog(lcd, buttons, ["self test", "test motor/buzzer", "test ultrasonic", "exit"])
+            if (choice == "self test"):
+                report = selftest.run(i2c, lcd, buttons, motor0, motor1, buzzer, sonic)
+                selftest.print_report(report)
+                selftest.show_summary(lcd, report)
+                buttons.wait_for_input()
+            elif (choice == "test motor/buzzer"):
+                #Display has only four rows, so buzzer is tested together with motors
+                test_buzzer(buzzer)
+                test_motors(lcd, motor0, motor1)
             elif (choice == "test ultrasonic"):
-                dist = sonic.get_distance_cm()
-                lcd.clear()
-                lcd.move_to(0, 0)
-                lcd.putstr("Distance:  {}".format(dist))
-                utime.sleep_ms(1000)
-            elif (choice == "test buzzer"):
-                buzzer.on()
-                utime.sleep_ms(500)
-                buzzer.off()
+                test_ultrasonic(lcd, sonic)
                 
             needs_redraw = True
                 